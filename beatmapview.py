@@ -1,19 +1,64 @@
 """
-依存: pip install pygame websocket-client
+依存: pip install pygame websocket-client numpy
+任意: pip install orjson  (あれば JSON デコードに使う。無ければ ujson も見る)
+任意: pip install numba   (あれば [HitObjects] の走査をネイティブコードで行う)
 前提: tosu が起動して http://127.0.0.1:24050 で動いていること
 """
 
+import functools
+import hashlib
+import importlib.util
 import os
+import re
+import select
 import sys
 import json
+import math
 import threading
 import time
-from dataclasses import dataclass, field
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
 from typing import Optional
 
-import bisect
+import numpy as np
 import pygame
-from websocket import WebSocketApp
+from websocket import ABNF, WebSocketException, create_connection
+
+import taiko_parse
+
+# mypyc でビルドした taiko_parse (.pyd / .so) があれば [HitObjects] の走査はそちらで行う（numba があればそちらが優先）
+SCANNER_COMPILED = taiko_parse.__file__.endswith((".pyd", ".so"))
+
+# orjson → ujson → json の順で使えるものを使う（C 実装の方が json より数倍速い）。
+# どれも bytes をそのまま受け取れる。壊れた入力の例外はどれも ValueError のサブクラス
+# （UTF-8 検証を省いているので json では UnicodeDecodeError も来る）
+try:
+    import orjson
+
+    json_loads = orjson.loads
+
+    def json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+except ImportError:
+    try:
+        import ujson
+
+        json_loads = ujson.loads
+
+        def json_dumps(obj) -> str:
+            return ujson.dumps(obj, ensure_ascii=False)
+    except ImportError:
+        json_loads = json.loads
+
+        def json_dumps(obj) -> str:
+            return json.dumps(obj, ensure_ascii=False)
+
+# numba があれば [HitObjects] の走査を JIT コンパイルしたバイト列スキャナで行う。
+# import とコンパイルは重い（初回 1 秒強、キャッシュが効いても 100 ms 台）ので、
+# ここでは有無だけ見て、実際に読み込むのはパースするワーカープロセスの中だけにする
+HAVE_NUMBA = importlib.util.find_spec("numba") is not None
 
 # ─── Mod ビットフラグ (osu! 標準) ──────────────────────
 MOD_DT = 1 << 6   # 64
@@ -40,9 +85,35 @@ def mods_to_label(mods_number: int) -> str:
 # ─── 設定 ──────────────────────────────────────────────
 TOSU_WS_URL        = "ws://127.0.0.1:24050/websocket/v2"
 TOSU_WS_PRECISE    = "ws://127.0.0.1:24050/websocket/v2/precise"
+WS_RECONNECT_DELAY = 3.0   # 切断・接続失敗から張り直すまでの秒数
+WS_PING_INTERVAL   = 30.0  # この間隔で ping を送る
+WS_PING_TIMEOUT    = 10.0  # ping 後これだけ何も届かなければ切れたとみなす
+
+# /v2 で受け取るフィールドを絞る（on_message が読むものだけ）。
+# 接続時に "applyFilters:<json>" を送ると tosu はこの形に削ったペイロードを返す
+TOSU_WS_FILTERS = [
+    {"field": "state",      "keys": ["name"]},
+    {"field": "play",       "keys": [{"field": "mods", "keys": ["number"]}]},
+    {"field": "beatmap",    "keys": [{"field": "time", "keys": ["live"]}]},
+    {"field": "directPath", "keys": ["beatmapFile"]},
+    {"field": "folders",    "keys": ["songs"]},
+]
 
 WINDOW_W, WINDOW_H = 1280, 360
 FPS = 240          # 高FPSでスクロールを滑らかに
+IDLE_FPS = 20      # 演奏中でなく画面も変わらない間はここまで落とす
+WINDOW_OPACITY = 220 / 255  # ウィンドウの不透明度 (0.0〜1.0)
+TIME_TEXT_INTERVAL = 0.016  # 経過時間表示を描き直す最短間隔 (秒)
+FPS_TEXT_INTERVAL  = 0.25   # FPS 表示を更新する間隔 (秒)
+BG_CACHE_SIZE = 8  # 背景 Surface をいくつのウィンドウサイズ分まで取っておくか
+
+# パース済みノーツのディスクキャッシュ。リトライや再起動で同じ譜面を読み直さない
+# Windows は %LOCALAPPDATA%、それ以外は $XDG_CACHE_HOME（無ければ ~/.cache）の下に置く
+NOTES_CACHE_DIR = os.path.join(os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME")
+                               or os.path.join(os.path.expanduser("~"), ".cache"),
+                               "osu-taiko-bv", "notes_cache")
+NOTES_CACHE_VERSION = 1      # パース結果の意味が変わったら上げる（古いキャッシュを無視させる）
+NOTES_CACHE_MAX_FILES = 500  # これを超えたら最後に使ったのが古い順に消す（1譜面あたり数十 KB）
 
 # Taiko ノーツ見た目
 HIT_CIRCLE_X  = 200          # 判定ライン X 座標
@@ -63,91 +134,259 @@ COL_HIT_RING   = (255, 255, 255)
 COL_TEXT       = (220, 220, 220)
 COL_WARN       = (255,  60,  60)
 
+# Mod ラベルの色（mods_to_label の戻り値で引く）
+MOD_COLORS = {"DT": (255, 200, 50), "NC": (255, 160, 80), "HT": (80, 180, 255)}
+
 NOTE_R_SMALL   = 28
 NOTE_R_BIG     = 40
 LANE_Y         = WINDOW_H // 2
 
-# ─── osu!ファイルパーサー ────────────────────────────────
-
-@dataclass
-class TaikoNote:
-    time_ms: int
-    note_type: str
-    end_time_ms: int = 0 
-
-def parse_osu_taiko(content: str) -> list[TaikoNote]:
-    """
-    .osu ファイルの [HitObjects] セクションを Taiko として解析する。
-    osu! の Taiko ノーツ変換ルールに従う。
-    """
-    notes: list[TaikoNote] = []
-    in_hit_objects = False
-
-    for raw_line in content.splitlines():
-        line = raw_line.strip()
+# ノーツ種別 → type_id (uint8)。色・半径の LUT はこの順で引く
+NOTE_TYPES   = ("don", "don_big", "kat", "kat_big", "drumroll", "drumroll_big", "spinner")
+(TYPE_DON, TYPE_DON_BIG, TYPE_KAT, TYPE_KAT_BIG,
+ TYPE_DRUMROLL, TYPE_DRUMROLL_BIG, TYPE_SPINNER) = range(len(NOTE_TYPES))
 
-        if line == "[HitObjects]":
-            in_hit_objects = True
-            continue
-        if line.startswith("[") and in_hit_objects:
-            break
-        if not in_hit_objects or not line or line.startswith("//"):
-            continue
+NOTE_COLORS = np.array([COL_DON, COL_DON_BIG, COL_KAT, COL_KAT_BIG,
+                        COL_DRUMROLL, COL_DRUMROLL, COL_SPINNER], dtype=np.uint8)
+NOTE_RADII  = np.array([NOTE_R_SMALL, NOTE_R_BIG, NOTE_R_SMALL, NOTE_R_BIG,
+                        NOTE_R_SMALL, NOTE_R_BIG, NOTE_R_SMALL], dtype=np.int32)
 
-        parts = line.split(",")
-        if len(parts) < 5:
-            continue
+# 時刻列は int32 で持つ。範囲外の値はキャストで巻き戻らないよう、この範囲に丸めてから詰める
+TIME_MS_MIN = int(np.iinfo(np.int32).min)
+TIME_MS_MAX = int(np.iinfo(np.int32).max)
 
-        try:
-            x        = int(parts[0])
-            hit_time = int(parts[2])
-            obj_type = int(parts[3])
-            hitsound = int(parts[4])
-        except ValueError:
-            continue
+# ─── osu!ファイルパーサー ────────────────────────────────
 
-        # スピナー (type & 8)
+@dataclass(frozen=True)
+class NoteArrays:
+    """ノーツの SoA 表現。描画ループはこちらだけを参照する（生成後は書き換えない）"""
+    times_ms: np.ndarray       # int32
+    end_times_ms: np.ndarray   # int32 (通常ノーツは times_ms と同じ)
+    type_id: np.ndarray        # uint8 (NOTE_TYPES のインデックス。大小・色・半径は LUT で引く)
+    base_px: np.ndarray        # int32 (time_ms * SCROLL_SPEED。描画時は原点を足すだけ)
+    base_end_px: np.ndarray    # int32 (end_time_ms * SCROLL_SPEED)
+    # 種別ごとのインデックス（昇順）。描画は種別ごとに別ループで回す
+    reg_idx: np.ndarray        # int32 don/kat (大含む)
+    roll_idx: np.ndarray       # int32 ドラムロール
+    spin_idx: np.ndarray       # int32 スピナー
+    max_hold_ms: int           # 長物の最大長さ (end - time)。判定ラインを跨いだ長物を拾う幅
+
+    def __len__(self) -> int:
+        return len(self.times_ms)
+
+
+def make_note_arrays(times: np.ndarray, ends: np.ndarray, type_id: np.ndarray) -> NoteArrays:
+    """time 順に並んだ times / ends / type_id から派生列を計算して NoteArrays を作る"""
+    # 丸めは単調なので、time 順に並んでいれば丸めた後も並びは崩れない
+    times    = np.clip(times, TIME_MS_MIN, TIME_MS_MAX).astype(np.int32, copy=False)
+    ends     = np.clip(np.maximum(ends, times), TIME_MS_MIN, TIME_MS_MAX).astype(np.int32, copy=False)
+    type_id  = type_id.astype(np.uint8, copy=False)
+    base_px     = np.rint(times * SCROLL_SPEED).astype(np.int32)
+    base_end_px = np.rint(ends * SCROLL_SPEED).astype(np.int32)
+    is_roll  = (type_id == TYPE_DRUMROLL) | (type_id == TYPE_DRUMROLL_BIG)
+    is_spin  = type_id == TYPE_SPINNER
+    reg_idx  = np.flatnonzero(~(is_roll | is_spin)).astype(np.int32)
+    roll_idx = np.flatnonzero(is_roll).astype(np.int32)
+    spin_idx = np.flatnonzero(is_spin).astype(np.int32)
+    max_hold = int((ends.astype(np.int64) - times).max()) if len(times) else 0
+    return NoteArrays(times, ends, type_id, base_px, base_end_px,
+                      reg_idx, roll_idx, spin_idx, max_hold)
+
+
+EMPTY_NOTES = make_note_arrays(np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32),
+                               np.zeros(0, dtype=np.uint8))
+
+
+# [HitObjects] の1行: x,y,time,type,hitSound[,残り]。x/time/type/hitSound は整数のみ受け付ける
+# グループ1 は "time,type,hitSound" をそのまま、グループ2 は残りのフィールド
+_HIT_OBJECTS_HEADER = re.compile(r"^[ \t]*\[HitObjects\][ \t]*$", re.MULTILINE)
+_NEXT_SECTION       = re.compile(r"^[ \t]*\[", re.MULTILINE)
+_HIT_OBJECT_LINE    = re.compile(
+    r"^[ \t]*-?\d+[ \t]*,[^,\n]*,([ \t]*-?\d+[ \t]*,[ \t]*-?\d+[ \t]*,[ \t]*-?\d+)[ \t]*"
+    r"(?:,([^\n]*))?$",
+    re.MULTILINE,
+)
+
+
+def _long_note_end(hit_time: int, obj_type: int, extra: str) -> int:
+    """長物の hitSound より後ろのフィールドから終了時刻を読む。読めなければ hit_time"""
+    fields = extra.split(",")
+    try:
         if obj_type & 8:
-            end_time = int(parts[5]) if len(parts) > 5 else hit_time
-            notes.append(TaikoNote(hit_time, "spinner", end_time))
-            continue
-
-        # スライダー → ドラムロール (type & 2)
-        if obj_type & 2:
-            end_time = hit_time
-            if len(parts) > 7:
-                try:
-                    slides = int(parts[6])
-                    length = float(parts[7])
-                    end_time = hit_time + int(length * 10)  # 暫定
-                except (ValueError, IndexError):
-                    pass
-            big = bool(hitsound & 4)
-            notes.append(TaikoNote(hit_time, "drumroll_big" if big else "drumroll", end_time))
-            continue
+            return int(fields[0])
+        if len(fields) > 2:
+            int(fields[1])   # slides (値は使わないが数値であることだけ確認)
+            return hit_time + int(float(fields[2]) * 10)  # 暫定
+    except ValueError:
+        pass
+    return hit_time
+
+
+def _scan_hit_objects_re(section: str) -> tuple:
+    """正規表現1回 + np.fromstring で time / type / hitSound / end の4列を読む"""
+    rows = _HIT_OBJECT_LINE.findall(section)
+    if not rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, empty
+
+    # 数値3列は1本の文字列に繋げて C 側でまとめて読む
+    ints     = np.fromstring(",".join([r[0] for r in rows]), dtype=np.int64, sep=",").reshape(-1, 3)
+    times    = ints[:, 0]
+    obj_type = ints[:, 1]
+    hitsound = ints[:, 2]
+
+    # 終了時刻が要るのは長物だけ（数は少ない）なので残りのフィールドはここで個別に読む
+    ends = times.copy()
+    for i in np.flatnonzero(obj_type & (8 | 2)).tolist():
+        ends[i] = _long_note_end(int(times[i]), int(obj_type[i]), rows[i][1])
+    return times, obj_type, hitsound, ends
+
+
+# numba 用のカーネル。ここでは素の関数で、_load_numba_scanner が初回に njit で包んで差し替える
+def _nb_read_int(buf, i, end):
+    r"""buf[i:end] の先頭から [ \t]*-?\d+[ \t]* を読む。(値, 読み終えた位置, 数字があったか)"""
+    while i < end and (buf[i] == 32 or buf[i] == 9):
+        i += 1
+    neg = i < end and buf[i] == 45
+    if neg:
+        i += 1
+    start = i
+    v = 0
+    while i < end and 48 <= buf[i] <= 57:
+        v = v * 10 + (buf[i] - 48)
+        i += 1
+    found = i > start
+    while i < end and (buf[i] == 32 or buf[i] == 9):
+        i += 1
+    return (-v if neg else v), i, found
+
+
+def _nb_scan_lines(buf):
+    """
+    _HIT_OBJECT_LINE と同じ文法で UTF-8 バイト列を1パスで走査する。
+    time / type / hitSound と、hitSound より後ろのフィールドの [開始, 終了) バイト位置を返す。
+    """
+    n     = len(buf)
+    cap   = n // 9 + 1   # 最短の行 "0,,0,1,0\n" でも 9 バイトあるので溢れない
+    times = np.empty(cap, dtype=np.int64)
+    types = np.empty(cap, dtype=np.int64)
+    hits  = np.empty(cap, dtype=np.int64)
+    ex_lo = np.empty(cap, dtype=np.int64)
+    ex_hi = np.empty(cap, dtype=np.int64)
+    rows  = 0
+    i = 0
+    while i < n:
+        e = i
+        while e < n and buf[e] != 10:
+            e += 1
+        _, p, ok = _nb_read_int(buf, i, e)   # x
+        if ok and p < e and buf[p] == 44:
+            p += 1
+            while p < e and buf[p] != 44:     # y は何でもよい
+                p += 1
+            if p < e:
+                t, p, ok = _nb_read_int(buf, p + 1, e)
+                if ok and p < e and buf[p] == 44:
+                    ty, p, ok = _nb_read_int(buf, p + 1, e)
+                    if ok and p < e and buf[p] == 44:
+                        hs, p, ok = _nb_read_int(buf, p + 1, e)
+                        if ok and (p == e or buf[p] == 44):
+                            times[rows] = t
+                            types[rows] = ty
+                            hits[rows]  = hs
+                            ex_lo[rows] = min(p + 1, e)
+                            ex_hi[rows] = e
+                            rows += 1
+        i = e + 1
+    return times[:rows], types[:rows], hits[:rows], ex_lo[:rows], ex_hi[:rows]
+
+
+_numba_ready: Optional[bool] = None   # None: まだ読んでいない / False: import できなかった
+
+def _load_numba_scanner() -> bool:
+    """numba を import してカーネルを njit で包む（ワーカーでの初回だけ）。使えるなら True"""
+    global _nb_read_int, _nb_scan_lines, _numba_ready
+    if _numba_ready is None:
+        try:
+            from numba import njit
+        except ImportError as e:   # 入ってはいるが NumPy と合わない等
+            print(f"[Parser] numba unavailable, using the fallback scanner: {e}")
+            _numba_ready = False
+            return False
+        # _nb_scan_lines は _nb_read_int をグローバルとして引くので、先に差し替えておく
+        _nb_read_int   = njit(cache=True)(_nb_read_int)
+        _nb_scan_lines = njit(cache=True)(_nb_scan_lines)
+        _numba_ready = True
+    return _numba_ready
+
+
+def warm_numba_scanner() -> None:
+    """ワーカーで先に numba のコンパイル（かキャッシュ読み込み）を済ませ、最初の譜面を待たせない"""
+    if HAVE_NUMBA and _load_numba_scanner():
+        _scan_hit_objects_nb("0,0,0,1,0\n")
+
+
+def _scan_hit_objects_nb(section: str) -> tuple:
+    """numba でバイト列を走査して time / type / hitSound / end の4列を読む"""
+    if not _load_numba_scanner():
+        raise ImportError("numba is not available")
+    raw = section.encode("utf-8")
+    times, obj_type, hitsound, ex_lo, ex_hi = _nb_scan_lines(np.frombuffer(raw, dtype=np.uint8))
+
+    # 長物の終了時刻は _scan_hit_objects_re と同じく Python 側で個別に読む（float を含むため）
+    ends = times.copy()
+    for i in np.flatnonzero(obj_type & (8 | 2)).tolist():
+        extra = raw[ex_lo[i]:ex_hi[i]].decode("utf-8", errors="replace")
+        ends[i] = _long_note_end(int(times[i]), int(obj_type[i]), extra)
+    return times, obj_type, hitsound, ends
+
+
+def scan_hit_objects(section: str) -> tuple:
+    """[HitObjects] の本文から time / type / hitSound / end の int64 配列4本を返す"""
+    if HAVE_NUMBA and _load_numba_scanner():
+        return _scan_hit_objects_nb(section)
+    if SCANNER_COMPILED:
+        return tuple(np.array(col, dtype=np.int64) for col in taiko_parse.scan_hit_objects(section))
+    return _scan_hit_objects_re(section)
+
+
+def parse_osu_taiko_arrays(content: str) -> NoteArrays:
+    """
+    .osu の [HitObjects] を osu! の Taiko 変換ルールで解析し、SoA を直接返す。
+    スピナー (type & 8) → spinner、スライダー (type & 2) → drumroll、
+    それ以外は hitSound の whistle/clap (2|8) で kat、finish (4) で大音符。
+    """
+    header = _HIT_OBJECTS_HEADER.search(content)
+    if header is None:
+        return EMPTY_NOTES
+    nxt     = _NEXT_SECTION.search(content, header.end())
+    section = content[header.end():nxt.start() if nxt else len(content)]
 
-        is_kat = bool(hitsound & 2) or bool(hitsound & 8)
-        is_big = bool(hitsound & 4)   # finish
+    times, obj_type, hitsound, ends = scan_hit_objects(section)
+    if len(times) == 0:
+        return EMPTY_NOTES
 
-        if is_kat:
-            ntype = "kat_big" if is_big else "kat"
-        else:
-            ntype = "don_big" if is_big else "don"
+    is_spinner = (obj_type & 8) != 0
+    is_slider  = ((obj_type & 2) != 0) & ~is_spinner
+    is_kat     = (hitsound & (2 | 8)) != 0
+    is_big     = (hitsound & 4) != 0
 
-        notes.append(TaikoNote(hit_time, ntype))
+    type_id = np.where(is_kat, TYPE_KAT, TYPE_DON) + is_big
+    type_id[is_slider]  = TYPE_DRUMROLL + is_big[is_slider]
+    type_id[is_spinner] = TYPE_SPINNER
 
-    notes.sort(key=lambda n: n.time_ms)
-    return notes
+    order = np.argsort(times, kind="stable")
+    return make_note_arrays(times[order], ends[order], type_id[order])
 
 
-def _fix_drumroll_endtimes(notes: list[TaikoNote], content: str) -> list[TaikoNote]:
+@dataclass(frozen=True)
+class ChartBundle:
     """
-    .osu の TimingPoints から SliderMultiplier / BPM を読んで
-    ドラムロール end_time を正確に計算する（オプション強化）。
-    sv 1.0 なら length * beat_duration、sv 0.5 なら length * beat_duration * 0.5 など。
-    本格対応は必要に応じて拡張してください。
+    ロード済み譜面1つ分。どの譜面のノーツかを一緒に持たせ、
+    state.chart への代入1回で丸ごと差し替える（描画側が中途半端な状態を見ないように）。
     """
-    return notes
+    beatmap_path: str
+    notes: NoteArrays
 
 
 # ─── ゲーム状態（スレッド間共有） ────────────────────────
@@ -156,19 +395,19 @@ def _fix_drumroll_endtimes(notes: list[TaikoNote], content: str) -> list[TaikoNo
 class GameState:
     # tosu から受け取るデータ
     state_name: str = "Menu"
-    game_time_ms: int = 0 
+    game_time_ms: int = 0   # /v2 の live 時刻。precise が来るまでの代わりで、書くのは on_message だけ
     beatmap_path: str = ""
     songs_folder: str = "" 
     audio_filename: str = ""
 
-    notes: list[TaikoNote] = field(default_factory=list)
-    loaded_beatmap_path: str = ""
-    lock: threading.Lock = field(default_factory=threading.Lock)
+    chart: Optional[ChartBundle] = None   # ローダーが差し替える。beatmap_path と一致する時だけ描く
 
     play_start_wall: float = 0.0
     play_start_game: int   = 0
 
-    # ウォールクロック補間用（precise受信時に更新）
+    # ウォールクロック補間用（precise受信時に更新）。
+    # 書くのは apply_precise_message だけで、描画スレッドのフレーム頭で呼ばれるので
+    # 読み書きが同じスレッドに閉じている（3つがずれて見えることはない）
     interp_wall: float = 0.0   # precise を受け取った瞬間のwall時刻
     interp_game: int   = 0     # precise を受け取った瞬間のgame時刻
     interp_speed: float = 1.0  # speed_rate のコピー
@@ -188,12 +427,20 @@ state = GameState()
 # ─── tosu WebSocket クライアント ──────────────────────────
 
 _debug_dumped = False  # 最初の1回だけ全体をダンプする
+_last_message = None   # 直前に処理したフレーム（メニューで放置中は同じ内容が届き続ける）
 
 def on_message(ws, message):
-    global _debug_dumped
+    global _debug_dumped, _last_message
+    # 前回と全く同じならパースしない（bytes の比較は長さ違いなら即終わる）。
+    # 同じ内容をもう一度処理した時に変わるのは prev_state だけなので、それだけ進める
+    if message == _last_message:
+        state.prev_state = state.state_name
+        return
+    _last_message = message
+
     try:
-        data = json.loads(message)
-    except json.JSONDecodeError:
+        data = json_loads(message)
+    except ValueError:
         return
 
     # ─── デバッグ: 最初の受信データのキー構造をダンプ ───
@@ -203,7 +450,7 @@ def on_message(ws, message):
         # beatmap / directPath / folders の中身を確認
         for key in ("beatmap", "directPath", "folders", "files", "state"):
             if key in data:
-                print(f"[DEBUG] data['{key}'] = {json.dumps(data[key], ensure_ascii=False)[:300]}")
+                print(f"[DEBUG] data['{key}'] = {json_dumps(data[key])[:300]}")
     # ────────────────────────────────────────────────────
 
     # lock なしで直接代入（GIL で安全、lock競合による描画詰まりを防ぐ）
@@ -239,7 +486,6 @@ def on_message(ws, message):
 
     if new_beatmap and new_beatmap != state.beatmap_path:
         state.beatmap_path = new_beatmap
-        state.notes = []
         print(f"[WS] Beatmap changed: {new_beatmap}")
 
 
@@ -247,67 +493,260 @@ def on_error(ws, error):
     print(f"[WS] Error: {error}")
 
 
-def on_close(ws, code, msg):
-    print("[WS] Connection closed. Reconnecting in 3s...")
-    time.sleep(3)
-    start_ws()
+def on_close(ws):
+    print(f"[WS] Connection closed. Reconnecting in {WS_RECONNECT_DELAY:.0f}s...")
 
 
 def on_open(ws):
     print("[WS] Connected to tosu!")
+    # フィルタ非対応の tosu なら無視されて従来どおり全体が届く
+    ws.send("applyFilters:" + json.dumps(TOSU_WS_FILTERS))
 
 
-def start_ws():
-    ws = WebSocketApp(
-        TOSU_WS_URL,
-        on_open=on_open,
-        on_message=on_message,
-        on_error=on_error,
-        on_close=on_close,
-    )
-    ws.run_forever()
+# ─── /v2/precise: currentTime だけ取って時刻補間に使う ───
 
+# currentTime のキーと終端文字（str / bytes どちらのフレームでも引けるように両方持つ）
+_CT_STR   = ('"currentTime":', ",", "}", ".")
+_CT_BYTES = (b'"currentTime":', b",", b"}", b".")
 
-# ─── /v2/precise: currentTime だけ取って時刻補間に使う ───
+def _valid_current_time(t):
+    """currentTime として使える値（bool を除く int と、有限の float）だけを通す。それ以外は None"""
+    if isinstance(t, bool) or not isinstance(t, (int, float)):
+        return None
+    if isinstance(t, float) and not math.isfinite(t):
+        return None
+    return t
+
+
+def parse_current_time(message):
+    """
+    precise ペイロードから currentTime を取り出す。
+    キーを直接探して数値を読み、読めなければ JSON 全体をパースする。
+    JSON と同じく整数なら int、小数なら float を返す。
+    オブジェクトでない JSON や、数値でない currentTime は None（フレームごと捨てる）。
+    高速経路は値の部分だけを int() / float() で読むので、JSON としては不正な
+    `1.` `.5` や、値の後ろが崩れたフレーム (`{"currentTime":12,}`) も数値として通す。
+    """
+    key, comma, brace, dot = _CT_STR if isinstance(message, str) else _CT_BYTES
+    i = message.find(key)
+    if i >= 0:
+        i += len(key)
+        j = message.find(comma, i)
+        k = message.find(brace, i)
+        end = j if 0 <= j < k or k < 0 else k
+        if end > i:
+            value = message[i:end]
+            try:
+                # tosu は小数付きで送ってくることがある。例外は遅いので先に見分ける
+                return _valid_current_time(float(value) if dot in value else int(value))
+            except ValueError:
+                pass
 
-def on_precise_message(ws, message):
     try:
-        data = json.loads(message)
-    except json.JSONDecodeError:
-        return
-    t = data.get("currentTime")
+        data = json_loads(message)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    return _valid_current_time(data.get("currentTime"))
+
+
+# 受信した precise フレームは最新の1件だけ残し、パースは描画スレッドが
+# フレーム頭で行う（描画の間に何件届いても効くのは最後の1件だけなので）
+_precise_inbox: deque = deque(maxlen=1)
+
+def on_precise_message(ws, message):
+    # 受信時刻はここでラッチしておく（補間の基準はパース時ではなく受信時）
+    _precise_inbox.append((time.perf_counter(), message))
+
+
+def apply_precise_message(recv_wall: float, message) -> None:
+    t = parse_current_time(message)
     if t is None:
         return
-    # precise 受信時にウォールクロックをラッチして補間の基準にする
-    state.game_time_ms = t
+    # game_time_ms には書かない（/v2 のスレッドと同じ値を取り合わないよう、書き手をフィールドごとに1つにする）
     state.interp_game  = t
-    state.interp_wall  = time.perf_counter()
+    state.interp_wall  = recv_wall
     state.interp_speed = state.speed_rate
 
 
-def on_precise_close(ws, code, msg):
-    time.sleep(3)
-    start_precise_ws()
+# ─── 受信スレッド: /v2 と /v2/precise を1本で select する ───
 
+# (URL, on_open, on_message, on_error, on_close)。precise は切断・エラーを黙って張り直す
+WS_ENDPOINTS = (
+    (TOSU_WS_URL,     on_open, on_message,         on_error, on_close),
+    (TOSU_WS_PRECISE, None,    on_precise_message, None,     None),
+)
 
-def start_precise_ws():
-    ws = WebSocketApp(
-        TOSU_WS_PRECISE,
-        on_message=on_precise_message,
-        on_error=lambda ws, e: None,
-        on_close=on_precise_close,
-    )
-    ws.run_forever()
+
+def ws_worker():
+    """
+    WS_ENDPOINTS の接続をすべて1本のスレッドで持ち、select で届いた方から1フレームずつ読んで
+    ハンドラに渡す（接続ごとにスレッドを立てて GIL を取り合わせない）。
+    切れた接続だけを WS_RECONNECT_DELAY 後に張り直す。
+    """
+    n_ep      = len(WS_ENDPOINTS)
+    conns     = [None] * n_ep   # 接続中の WebSocket（未接続は None）
+    retry_at  = [0.0] * n_ep
+    last_recv = [0.0] * n_ep
+    last_ping = [0.0] * n_ep
+
+    def drop(n: int, error) -> None:
+        _, _, _, on_err, on_cls = WS_ENDPOINTS[n]
+        ws = conns[n]
+        conns[n]    = None
+        retry_at[n] = time.monotonic() + WS_RECONNECT_DELAY
+        ws.shutdown()
+        if error is not None and on_err:
+            on_err(ws, error)
+        if on_cls:
+            on_cls(ws)
+
+    while True:
+        now = time.monotonic()
+        for n, (url, on_opn, _, on_err, _) in enumerate(WS_ENDPOINTS):
+            if conns[n] is not None or now < retry_at[n]:
+                continue
+            try:
+                # UTF-8 検証は省略（tosu は正しい UTF-8 を送る。フレームは bytes のまま受け取る）
+                ws = create_connection(url, timeout=WS_PING_TIMEOUT, skip_utf8_validation=True)
+            except Exception as e:
+                retry_at[n] = now + WS_RECONNECT_DELAY
+                if on_err:
+                    on_err(None, e)
+                continue
+            conns[n]     = ws
+            last_recv[n] = last_ping[n] = now
+            if on_opn:
+                try:
+                    on_opn(ws)   # 購読要求の送信。ここで切れても受信スレッドは止めない
+                except (WebSocketException, OSError) as e:
+                    drop(n, e)
+
+        live = [ws for ws in conns if ws is not None]
+        if not live:
+            time.sleep(min(retry_at) - now if min(retry_at) > now else 0.1)
+            continue
+        ready, _, _ = select.select(live, [], [], 0.5)
+
+        now = time.monotonic()
+        for n, ws in enumerate(conns):
+            if ws is None:
+                continue
+            if ws in ready:
+                try:
+                    # ping への pong は recv_data の中で返される。制御フレームも1枚で返させて、
+                    # 次のデータフレームが来るまでここで止まらないようにする
+                    opcode, data = ws.recv_data(control_frame=True)
+                except (WebSocketException, OSError) as e:
+                    drop(n, e)
+                    continue
+                last_recv[n] = now
+                if opcode == ABNF.OPCODE_CLOSE:
+                    drop(n, None)
+                    continue
+                if opcode == ABNF.OPCODE_TEXT or opcode == ABNF.OPCODE_BINARY:
+                    _, _, on_msg, on_err, _ = WS_ENDPOINTS[n]
+                    try:
+                        on_msg(ws, data)
+                    except Exception as e:
+                        if on_err:
+                            on_err(ws, e)
+            elif now - last_recv[n] > WS_PING_INTERVAL + WS_PING_TIMEOUT:
+                drop(n, TimeoutError("no data from tosu"))
+            elif now - last_ping[n] >= WS_PING_INTERVAL:
+                last_ping[n] = now
+                try:
+                    ws.ping()
+                except (WebSocketException, OSError) as e:
+                    drop(n, e)
 
 
 # ─── 譜面ロード（別スレッド） ─────────────────────────────
 
+def notes_cache_path(full_path: str) -> str:
+    """譜面のパスと更新時刻からキャッシュファイル名を決める（譜面が書き換われば別キーになる）"""
+    key = f"{NOTES_CACHE_VERSION}:{full_path}:{os.path.getmtime(full_path)}"
+    return os.path.join(NOTES_CACHE_DIR, hashlib.sha1(key.encode()).hexdigest() + ".npz")
+
+
+def prune_notes_cache(max_files: int = NOTES_CACHE_MAX_FILES) -> None:
+    """
+    キャッシュが max_files を超えていたら、更新時刻（= 最後に使った時刻）の古い順に消す。
+    譜面を編集するたびに別キーのファイルが増えるので、古い版もここで消える。
+    """
+    try:
+        entries = [e for e in os.scandir(NOTES_CACHE_DIR) if e.is_file()]
+    except OSError:
+        return
+    if len(entries) <= max_files:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    for e in entries[:len(entries) - max_files]:
+        try:
+            os.remove(e.path)
+        except OSError:
+            pass
+
+
+def load_note_arrays(full_path: str) -> NoteArrays:
+    """
+    .osu を読んで SoA まで作る。ワーカープロセスで実行される。
+    times / ends / type_id の3列だけをキャッシュし、派生列はその都度 make_note_arrays で作る。
+    """
+    cache_path = notes_cache_path(full_path)
+    try:
+        with np.load(cache_path) as z:
+            arrays = make_note_arrays(z["times"], z["ends"], z["type_id"])
+        try:
+            os.utime(cache_path)   # 最後に使った時刻として残し、prune で消されにくくする
+        except OSError:
+            pass
+        return arrays
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"[Cache] Ignoring broken cache {cache_path}: {e}")
+
+    with open(full_path, encoding="utf-8", errors="replace") as f:
+        raw = f.read()
+    arrays = parse_osu_taiko_arrays(raw)
+
+    # 一時ファイルに書いてから os.replace で差し替え、書きかけのファイルを読ませない
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(NOTES_CACHE_DIR, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            np.savez(f, times=arrays.times_ms, ends=arrays.end_times_ms, type_id=arrays.type_id)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:   # キャッシュは無くても動くので、書けなくても読み込みは成功させる
+        print(f"[Cache] Write failed: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    else:
+        prune_notes_cache()
+    return arrays
+
+
+def start_parser_pool() -> ProcessPoolExecutor:
+    """パース用のワーカープロセスを立て、numba があれば譜面が来る前に JIT を温めておく"""
+    executor = ProcessPoolExecutor(max_workers=1)
+    if HAVE_NUMBA:
+        executor.submit(warm_numba_scanner)   # 結果は待たない。失敗しても本番のパースで代替に落ちる
+    return executor
+
+
 def beatmap_loader_thread():
+    # パースは純 Python で GIL を握り続けるので、描画と取り合わないよう別プロセスで行う
+    executor = start_parser_pool()
     while True:
         time.sleep(0.3)
         current_rel  = state.beatmap_path
         songs_folder = state.songs_folder
-        already      = state.loaded_beatmap_path
+        chart        = state.chart
+        already      = chart.beatmap_path if chart is not None else ""
 
         if not current_rel or not songs_folder:
             continue
@@ -317,44 +756,44 @@ def beatmap_loader_thread():
         full_path = os.path.join(songs_folder, current_rel)
         print(f"[Loader] Loading: {full_path}")
         try:
-            with open(full_path, encoding="utf-8", errors="replace") as f:
-                raw = f.read()
-            notes = parse_osu_taiko(raw)
-            print(f"[Loader] Parsed {len(notes)} notes")
-            state.notes = notes
-            state.loaded_beatmap_path = current_rel
-            note_times_cache[:] = [n.time_ms for n in notes]
+            arrays = executor.submit(load_note_arrays, full_path).result()
+            print(f"[Loader] Parsed {len(arrays)} notes")
+            state.chart = ChartBundle(current_rel, arrays)
         except FileNotFoundError:
             print(f"[Loader] File not found: {full_path}")
+        except BrokenProcessPool:
+            print("[Loader] Parser process died. Restarting pool")
+            executor = start_parser_pool()
         except Exception as e:
             print(f"[Loader] Error: {e}")
 
 
 # ─── ノーツ描画ヘルパー ──────────────────────────────────────
 
-def note_color(ntype: str):
-    return {
-        "don": COL_DON, "don_big": COL_DON_BIG,
-        "kat": COL_KAT, "kat_big": COL_KAT_BIG,
-        "drumroll": COL_DRUMROLL, "drumroll_big": COL_DRUMROLL,
-        "spinner": COL_SPINNER,
-    }.get(ntype, COL_DON)
-
-def note_radius(ntype: str) -> int:
-    return NOTE_R_BIG if "big" in ntype else NOTE_R_SMALL
-
-
-def build_note_surfs() -> dict:
-    """don/kat/big をサーフェスにプリレンダ"""
+def build_note_surfs() -> list:
+    """
+    ノーツの円をサーフェスにプリレンダ（type_id で引く）。
+    don/kat/big は本体、ドラムロールは両端のキャップ、スピナーは両端のリング。
+    どれも正方形で、中心が (幅 // 2, 幅 // 2) に来る。
+    """
     import pygame
-    surfs = {}
-    for ntype in ("don", "don_big", "kat", "kat_big"):
-        r   = note_radius(ntype)
-        col = note_color(ntype)
+    surfs = [None] * len(NOTE_TYPES)
+    for tid in (TYPE_DON, TYPE_DON_BIG, TYPE_KAT, TYPE_KAT_BIG):
+        r   = int(NOTE_RADII[tid])
+        col = NOTE_COLORS[tid].tolist()
         s   = pygame.Surface((r*2+4, r*2+4), pygame.SRCALPHA)
         pygame.draw.circle(s, col,             (r+2, r+2), r)
         pygame.draw.circle(s, (255,255,255),   (r+2, r+2), r, 2)
-        surfs[ntype] = s
+        surfs[tid] = s
+    for tid in (TYPE_DRUMROLL, TYPE_DRUMROLL_BIG):
+        r = int(NOTE_RADII[tid])
+        s = pygame.Surface((r*2+4, r*2+4), pygame.SRCALPHA)
+        pygame.draw.circle(s, NOTE_COLORS[tid].tolist(), (r+2, r+2), r)
+        surfs[tid] = s
+    r = NOTE_R_SMALL + 6
+    s = pygame.Surface((r*2+4, r*2+4), pygame.SRCALPHA)
+    pygame.draw.circle(s, COL_SPINNER, (r+2, r+2), r, 4)
+    surfs[TYPE_SPINNER] = s
     return surfs
 
 
@@ -372,13 +811,62 @@ def build_static_bg(surf, W, H, LY):
         pygame.draw.circle(surf, COL_HIT_RING, (HIT_CIRCLE_X, LY), r, w)
 
 
+def wait_until(deadline: float) -> None:
+    """
+    perf_counter が deadline に達するまで待つ。
+    1ms 手前までは sleep で GIL と CPU を手放し、残りだけスピンする
+    （timeBeginPeriod(1) 下なら sleep の誤差は ~1ms）。
+    """
+    remaining = deadline - time.perf_counter()
+    if remaining > 0.001:
+        time.sleep(remaining - 0.001)
+    while time.perf_counter() < deadline:
+        pass
+
+
+def apply_window_style(opacity: float):
+    """
+    pygame のウィンドウを最前面・半透明にする（SDL2 Window API、無ければ Win32 API）。
+    作った Window を返すので、呼び出し側はセッションの間ずっと持っておくこと。
+    SDL 側のウィンドウはこのオブジェクトを生ポインタで指しているので、解放されると
+    以降のウィンドウイベントで解放済みメモリを読んで落ちる（pygame 2.6.1 で確認）。
+    from_display_module() を2回呼ぶとポインタが差し替わるので、1セッション1回だけ呼ぶ。
+    """
+    import pygame
+    try:
+        from pygame._sdl2.video import Window
+        window = Window.from_display_module()
+    except Exception as e:
+        print(f"[BV] SDL2 window API unavailable: {e}")
+        return None
+
+    try:
+        window.opacity = opacity
+    except Exception as e:
+        print(f"[BV] Opacity not supported: {e}")
+
+    try:
+        window.always_on_top = True
+    except AttributeError:
+        # always_on_top が無い pygame では HWND に直接 HWND_TOPMOST を付ける
+        try:
+            import ctypes
+            hwnd = pygame.display.get_wm_info()["window"]
+            # SWP_NOMOVE | SWP_NOSIZE
+            ctypes.windll.user32.SetWindowPos(hwnd, -1, 0, 0, 0, 0, 0x0002 | 0x0001)
+        except Exception as e:
+            print(f"[BV] Always-on-top not supported: {e}")
+            return window
+    print("[BV] Always-on-top enabled")
+    return window
+
+
 # ─── pygame レンダラー ────────────────────────────────────────
 
 def run_renderer(window_w: int, window_h: int):
     global WINDOW_W, WINDOW_H, LANE_Y
     import pygame
     import ctypes
-    import tkinter as tk
 
     # Windows タイマー精度 1ms
     try:
@@ -390,65 +878,109 @@ def run_renderer(window_w: int, window_h: int):
     WINDOW_H = window_h
     LANE_Y   = window_h // 2
 
-    # ── tkinter ウィンドウ（最前面・半透明を担当）────────────
-    root = tk.Tk()
-    root.title("osu!taiko BeatmapView")
-    root.geometry(f"{window_w}x{window_h}")
-    root.resizable(True, True)
-    root.attributes("-topmost", True)
-    root.attributes("-alpha", 220/255)
+    pygame.init()
+    pygame.display.set_caption("osu!taiko BeatmapView")
 
-    # アイコン
+    # アイコン（set_mode より前に設定する）
     icon_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images.ico")
     if os.path.exists(icon_path):
         try:
-            root.iconbitmap(icon_path)
+            pygame.display.set_icon(pygame.image.load(icon_path))
             print("[BV] Icon loaded")
         except Exception as e:
             print(f"[BV] Icon load failed: {e}")
 
-    embed = tk.Frame(root, width=window_w, height=window_h)
-    embed.pack(fill=tk.BOTH, expand=True)
-    embed.update()
-
-    # ── pygame を tkinter Frame に埋め込む（windib なし）────
-    os.environ["SDL_WINDOWID"] = str(embed.winfo_id())
-    # SDL_VIDEODRIVER は設定しない（windib を使わない）
-
-    pygame.init()
-    screen = pygame.display.set_mode((window_w, window_h))
+    # ── pygame ウィンドウ（最前面・半透明も pygame/SDL2 側で設定）──
+    screen = pygame.display.set_mode((window_w, window_h), pygame.RESIZABLE)
+    # Window は pygame.quit までこの関数のローカルに持っておく（docstring 参照）
+    sdl_window = apply_window_style(WINDOW_OPACITY)
     clock  = pygame.time.Clock()
 
     font_sm = pygame.font.SysFont("monospace", 18)
     font_md = pygame.font.SysFont("monospace", 24, bold=True)
 
-    static_bg  = pygame.Surface((WINDOW_W, WINDOW_H))
-    build_static_bg(static_bg, WINDOW_W, WINDOW_H, LANE_Y)
-    note_surfs = build_note_surfs()
+    # HUD の文字列はほとんど変わらないので描画済み Surface を使い回す
+    @functools.lru_cache(maxsize=64)
+    def render_text(font, text: str, color: tuple):
+        return font.render(text, True, color)
 
-    print("[BV] Always-on-top enabled (tkinter)")
+    # 背景はサイズごとに作って取っておく（ドラッグで元のサイズに戻った時は描き直さない）。
+    # ドラッグ中は途中のサイズが大量に来るので、ウィンドウ全面の Surface を溜め込まないよう件数を絞る
+    @functools.lru_cache(maxsize=BG_CACHE_SIZE)
+    def get_static_bg(W: int, H: int) -> pygame.Surface:
+        surf = pygame.Surface((W, H))
+        build_static_bg(surf, W, H, H // 2)
+        return surf
+
+    static_bg  = get_static_bg(WINDOW_W, WINDOW_H)
+    note_surfs = build_note_surfs()
+    # サーフェス左上から中心までのずれ（type_id で引く）
+    surf_offs  = np.array([s.get_width() // 2 for s in note_surfs], dtype=np.int32)
 
-    # ── pygame ループ（別スレッド）───────────────────────────
+    # ── pygame ループ（メインスレッド）───────────────────────
     _stop = [False]
 
+    # searchsorted のクエリ用バッファ（毎フレーム確保しない）
+    # times は整数なので bisect_right(t) == searchsorted(t+1, "left") で1回にまとめられる
+    window_q = np.zeros(2, dtype=np.int32)
+    # 長物用: 頭が判定ラインを過ぎても尾が残っているものを拾うため max_hold_ms だけ遡る
+    hold_q   = np.zeros(2, dtype=np.int32)
+
     def pygame_loop():
         global WINDOW_W, WINDOW_H, LANE_Y
-        nonlocal static_bg
+        nonlocal static_bg, screen
+        # 前フレームでノーツを描いた矩形。次フレームはここだけ static_bg で塗り戻す
+        prev_dirty: list = []
+        # 画面に出ている HUD: slot -> (surface, 位置)。変わらないものは描き直さない
+        hud_shown: dict = {}
+        # 前フレームのノーツの原点と譜面。どちらも同じならノーツは描き直さない
+        prev_origin = None
+        prev_arrays = None
+        full_redraw = True
+        # 経過時間は表示が変わった時だけ、最短でも TIME_TEXT_INTERVAL おきに描き直す
+        t_surf      = None
+        t_surf_wall = 0.0
+        t_surf_ms   = None
+        # FPS 表示は FPS_TEXT_INTERVAL おきに更新する（毎フレーム書式化しない）
+        fps_surf    = None
+        fps_wall    = 0.0
+        frame_period = 1.0 / FPS
+        idle_period  = 1.0 / IDLE_FPS
+        next_frame   = time.perf_counter()
+        # ループ内で使う関数・LUT はローカルに引いておく
+        draw_rect   = pygame.draw.rect
+        radii_lut   = NOTE_RADII
+        colors_lut  = NOTE_COLORS
 
         while not _stop[0]:
-            # リサイズ検出（set_mode は呼ばず Surface だけ作り直す）
-            W = embed.winfo_width()
-            H = embed.winfo_height()
-            if W > 1 and H > 1 and (W != WINDOW_W or H != WINDOW_H):
-                WINDOW_W = W
-                WINDOW_H = H
-                LANE_Y   = H // 2
-                static_bg = pygame.Surface((W, H))
-                build_static_bg(static_bg, W, H, LANE_Y)
-
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     _stop[0] = True
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                    _stop[0] = True
+                elif event.type == pygame.VIDEORESIZE:
+                    # RESIZABLE なので表示 Surface は SDL 側で作り直される。背景だけ描き直す
+                    W, H = event.w, event.h
+                    if W > 1 and H > 1 and (W != WINDOW_W or H != WINDOW_H):
+                        WINDOW_W = W
+                        WINDOW_H = H
+                        LANE_Y   = H // 2
+                        screen    = pygame.display.get_surface()
+                        static_bg = get_static_bg(W, H)
+                        full_redraw = True
+                elif event.type == pygame.WINDOWEXPOSED or event.type == pygame.VIDEOEXPOSE:
+                    # 差分しか描かないので、隠れていた所が見えた時は丸ごと描き直す
+                    full_redraw = True
+
+            # precise の最新フレームを取り込む
+            if _precise_inbox:
+                try:
+                    apply_precise_message(*_precise_inbox.popleft())
+                except IndexError:
+                    pass
+                except Exception as e:
+                    # 壊れたフレームは捨てて次を待つ（描画ループは止めない）
+                    print(f"[WS] Bad precise frame dropped: {e}")
 
             # 時刻補間
             interp_wall  = state.interp_wall
@@ -461,75 +993,169 @@ def run_renderer(window_w: int, window_h: int):
                 current_ms = state.game_time_ms
 
             game_state = state.state_name
-            notes_snap = state.notes
+            chart      = state.chart
+            # 譜面が切り替わった直後は、新しい譜面のロードが終わるまで何も描かない
+            if chart is not None and chart.beatmap_path == state.beatmap_path:
+                arrays = chart.notes
+            else:
+                arrays = EMPTY_NOTES
             mod_label  = state.mod_label
+            base_px     = arrays.base_px
+            base_end_px = arrays.base_end_px
+            type_id     = arrays.type_id
 
-            # 描画
-            screen.blit(static_bg, (0, 0))
-
-            lo = bisect.bisect_left(note_times_cache, current_ms)
-            hi = bisect.bisect_right(note_times_cache, current_ms + LOOKAHEAD_MS)
-
-            for i in range(lo, min(hi, len(notes_snap))):
-                note = notes_snap[i]
-                dtt  = note.time_ms - current_ms
-                nx   = HIT_CIRCLE_X + int(dtt * SCROLL_SPEED)
-                r    = note_radius(note.note_type)
-                col  = note_color(note.note_type)
-
-                if note.note_type in ("drumroll", "drumroll_big"):
-                    end_dtt = note.end_time_ms - current_ms
-                    if end_dtt < 0:
-                        continue
-                    ex    = HIT_CIRCLE_X + int(end_dtt * SCROLL_SPEED)
-                    bar_y = LANE_Y - r // 2
-                    pygame.draw.rect(screen, col, (nx, bar_y, max(ex-nx, 4), r))
-                    pygame.draw.circle(screen, col, (nx, LANE_Y), r)
-                    pygame.draw.circle(screen, col, (ex, LANE_Y), r)
-                elif note.note_type == "spinner":
-                    end_dtt = note.end_time_ms - current_ms
-                    if end_dtt < 0:
-                        continue
-                    ex = HIT_CIRCLE_X + int(end_dtt * SCROLL_SPEED)
-                    pygame.draw.rect(screen, col, (nx, LANE_Y-6, max(ex-nx, 4), 12))
-                    for cx in (nx, ex):
-                        pygame.draw.circle(screen, col, (cx, LANE_Y), NOTE_R_SMALL+6, 4)
-                else:
-                    if dtt < 0:
-                        continue
-                    s = note_surfs.get(note.note_type)
-                    if s:
-                        screen.blit(s, (nx - r - 2, LANE_Y - r - 2))
-
-            fps       = clock.get_fps()
+            # HUD の中身は先に決める（消えた・変わった HUD の跡をノーツより先に塗り戻すため）
             state_col = (100,255,100) if game_state == "Playing" else COL_WARN
-            screen.blit(font_md.render(game_state, True, state_col), (10, 10))
+            hud = {"state": (render_text(font_md, game_state, state_col), (10, 10))}
             if mod_label:
-                mc = {"DT":(255,200,50),"NC":(255,160,80),"HT":(80,180,255)}.get(mod_label, COL_TEXT)
-                screen.blit(font_md.render(mod_label, True, mc), (160, 10))
-            mins = current_ms // 60000
-            secs = (current_ms % 60000) // 1000
-            ms   = current_ms % 1000
-            t_surf = font_sm.render(f"{mins:02d}:{secs:02d}.{ms:03d}", True, COL_TEXT)
-            screen.blit(t_surf, (WINDOW_W - t_surf.get_width() - 10, 10))
-            fps_surf = font_sm.render(f"{fps:.0f}fps", True, (120,120,120))
-            screen.blit(fps_surf, (10, WINDOW_H - fps_surf.get_height() - 6))
-
-            pygame.display.flip()
-            clock.tick_busy_loop(FPS)
-
-        pygame.quit()
+                mc = MOD_COLORS.get(mod_label, COL_TEXT)
+                hud["mod"] = (render_text(font_md, mod_label, mc), (160, 10))
+            now = time.perf_counter()
+            if t_surf is None or (current_ms != t_surf_ms and now - t_surf_wall >= TIME_TEXT_INTERVAL):
+                mins = current_ms // 60000
+                secs = (current_ms % 60000) // 1000
+                ms   = current_ms % 1000
+                t_surf      = font_sm.render(f"{mins:02d}:{secs:02d}.{ms:03d}", True, COL_TEXT)
+                t_surf_wall = now
+                t_surf_ms   = current_ms
+            hud["time"] = (t_surf, (WINDOW_W - t_surf.get_width() - 10, 10))
+            if fps_surf is None or now - fps_wall >= FPS_TEXT_INTERVAL:
+                fps_surf = render_text(font_sm, f"{clock.get_fps():.0f}fps", (120,120,120))
+                fps_wall = now
+            hud["fps"]  = (fps_surf, (10, WINDOW_H - fps_surf.get_height() - 6))
+
+            # ピクセル位置はロード時に計算済みなので、フレームごとにはスカラーの原点を足すだけ。
+            # 原点も譜面も前フレームと同じ（ポーズ中・選曲画面など）ならノーツは画面に残っているものを使う
+            origin = HIT_CIRCLE_X - round(current_ms * SCROLL_SPEED)
+            notes_static = not full_redraw and origin == prev_origin and arrays is prev_arrays
+            prev_origin  = origin
+            prev_arrays  = arrays
+
+            # 描き直す HUD を決める: 変わったもの・ノーツの帯に掛かるもの・塗り戻す所に掛かるもの。
+            # アンチエイリアスの文字を重ね塗りしないよう、描き直す HUD は矩形ごと背景に戻してから描く
+            hud_restore = [surf.get_rect(topleft=pos) for slot, (surf, pos) in hud_shown.items()
+                           if hud.get(slot) != (surf, pos)]
+            hud_redraw  = set()
+            lane_band   = pygame.Rect(0, LANE_Y - NOTE_R_BIG - 2, WINDOW_W, (NOTE_R_BIG + 2) * 2)
+            grew = True
+            while grew:   # HUD 同士が重なっている場合に備えて、増えなくなるまで回す
+                grew = False
+                for slot, (surf, pos) in hud.items():
+                    if slot in hud_redraw:
+                        continue
+                    r = surf.get_rect(topleft=pos)
+                    if (full_redraw or hud_shown.get(slot) != (surf, pos)
+                            or r.colliderect(lane_band) or r.collidelist(hud_restore) >= 0):
+                        hud_redraw.add(slot)
+                        hud_restore.append(r)
+                        grew = True
+
+            # 描画: 背景は前フレームでノーツを描いた所と、描き直す HUD の所だけ戻す
+            if notes_static and any(r.collidelist(prev_dirty) >= 0 for r in hud_restore):
+                notes_static = False   # HUD の跡を戻すとノーツも欠けるので描き直す
+            restored = hud_restore if notes_static else prev_dirty + hud_restore
+            if full_redraw:
+                screen.blit(static_bg, (0, 0))
+            elif restored:
+                screen.blits([(static_bg, r, r) for r in restored], doreturn=False)
+            dirty = []
+            mark  = dirty.append
+
+            if not notes_static:
+                window_q[0] = current_ms
+                window_q[1] = current_ms + LOOKAHEAD_MS + 1
+                lohi = np.searchsorted(arrays.times_ms, window_q)
+                hold_q[0] = max(current_ms - arrays.max_hold_ms, TIME_MS_MIN)
+                hold_q[1] = window_q[1]
+                hold_lohi = np.searchsorted(arrays.times_ms, hold_q)
+
+                # 判定ラインを過ぎたもの・画面右外のものは種別ごとにマスクでまとめて間引く
+                right  = WINDOW_W + NOTE_R_BIG
+
+                # 円はすべてプリレンダ済みサーフェスなので、ここに集めて最後に Surface.blits 1回で描く
+                blit_list  = []
+                queue_blit = blit_list.append
+
+                # ドラムロール: バーは矩形、両端はキャップのブリット
+                a, b = arrays.roll_idx.searchsorted(hold_lohi).tolist()
+                # 窓内に1本も無いフレームが大半なので、その時は配列演算ごと飛ばす
+                if a < b:
+                    idx  = arrays.roll_idx[a:b]
+                    nxs  = base_px[idx] + origin
+                    exs  = base_end_px[idx] + origin
+                    keep = (exs >= HIT_CIRCLE_X) & (nxs <= right)
+                    nxs  = nxs[keep]
+                    exs  = exs[keep]
+                    tids = type_id[idx][keep]
+                    rads = radii_lut[tids]
+                    offs = surf_offs[tids]
+                    # バーの y・幅・キャップ位置も配列で出しておき、ループ内は描画呼び出しだけにする
+                    for tid, bar_x, bar_y, bar_w, r, col, hx, tx, cy in zip(
+                            tids.tolist(), nxs.tolist(), (LANE_Y - rads // 2).tolist(),
+                            np.maximum(exs - nxs, 4).tolist(), rads.tolist(), colors_lut[tids].tolist(),
+                            (nxs - offs).tolist(), (exs - offs).tolist(), (LANE_Y - offs).tolist()):
+                        mark(draw_rect(screen, col, (bar_x, bar_y, bar_w, r)))
+                        cap = note_surfs[tid]
+                        queue_blit((cap, (hx, cy)))
+                        queue_blit((cap, (tx, cy)))
+
+                # スピナー
+                a, b = arrays.spin_idx.searchsorted(hold_lohi).tolist()
+                if a < b:
+                    idx  = arrays.spin_idx[a:b]
+                    nxs  = base_px[idx] + origin
+                    exs  = base_end_px[idx] + origin
+                    keep = (exs >= HIT_CIRCLE_X) & (nxs <= right)
+                    nxs  = nxs[keep]
+                    exs  = exs[keep]
+                    ring = note_surfs[TYPE_SPINNER]
+                    off  = int(surf_offs[TYPE_SPINNER])
+                    for nx, ex, bar_w in zip(nxs.tolist(), exs.tolist(), np.maximum(exs - nxs, 4).tolist()):
+                        mark(draw_rect(screen, COL_SPINNER, (nx, LANE_Y-6, bar_w, 12)))
+                        queue_blit((ring, (nx - off, LANE_Y - off)))
+                        queue_blit((ring, (ex - off, LANE_Y - off)))
+
+                # 通常ノーツ: 左上座標まで配列で計算する（長物の上に重なるよう最後に積む）
+                a, b = arrays.reg_idx.searchsorted(lohi).tolist()
+                idx  = arrays.reg_idx[a:b]
+                nxs  = base_px[idx] + origin
+                keep = (nxs >= HIT_CIRCLE_X) & (nxs <= right)
+                tids = type_id[idx][keep]
+                offs = surf_offs[tids]
+                blit_list += [(note_surfs[tid], (x, y)) for tid, x, y in
+                              zip(tids.tolist(), (nxs[keep] - offs).tolist(), (LANE_Y - offs).tolist())]
+                if blit_list:
+                    dirty += screen.blits(blit_list)
+
+            # HUD はノーツの上に重ねる
+            hud_drawn = [screen.blit(surf, pos) for slot, (surf, pos) in hud.items() if slot in hud_redraw]
+            hud_shown = hud
+
+            # 画面に送るのは「今フレーム塗り戻した所 + 描いた所」だけ
+            if full_redraw:
+                pygame.display.flip()
+                full_redraw = False
+            else:
+                pygame.display.update(restored + dirty + hud_drawn)
+            if not notes_static:
+                prev_dirty = dirty
 
-    pg_thread = threading.Thread(target=pygame_loop, daemon=True)
-    pg_thread.start()
+            # 演奏中でなく、このフレームで何も描かなかった（ノーツも HUD もそのまま）なら長めに待つ
+            if not state.playing and notes_static and not hud_redraw:
+                next_frame += idle_period
+            else:
+                next_frame += frame_period
+            now = time.perf_counter()
+            if next_frame < now:   # 間に合わなかったフレームは取り返さない
+                next_frame = now
+            wait_until(next_frame)
+            clock.tick()           # FPS 計測のみ（待ちは wait_until が行う）
 
-    root.bind("<Escape>", lambda e: (root.destroy(), _stop.__setitem__(0, True)))
-    root.mainloop()
-    _stop[0] = True
+        pygame.quit()
 
+    pygame_loop()
+    del sdl_window   # ウィンドウが閉じた（pygame.quit 済み）後で手放す
 
-# note_times キャッシュ（bisect用、beatmap_loader_thread が更新）
-note_times_cache: list = []
 
 # ─── エントリーポイント ───────────────────────────────────
 
@@ -547,12 +1173,9 @@ def main():
     print("  ESC で終了")
     print("=" * 50)
 
-    ws_thread = threading.Thread(target=start_ws, daemon=True)
+    ws_thread = threading.Thread(target=ws_worker, daemon=True)
     ws_thread.start()
 
-    precise_thread = threading.Thread(target=start_precise_ws, daemon=True)
-    precise_thread.start()
-
     loader_thread = threading.Thread(target=beatmap_loader_thread, daemon=True)
     loader_thread.start()
 
@@ -0,0 +1,86 @@
+"""
+[HitObjects] の走査だけを切り出したモジュール。
+
+純 Python のままでも動くが、mypyc でコンパイルできるように型を付けてある:
+
+    pip install mypy
+    mypyc taiko_parse.py
+
+ビルドされた拡張モジュール (taiko_parse.*.pyd / .so) は同じ名前の .py より
+優先して import されるので、beatmapview.py 側の変更は不要。
+"""
+
+
+def scan_hit_objects(section: str) -> tuple[list[int], list[int], list[int], list[int]]:
+    """
+    [HitObjects] セクション本文（見出し行の後ろ）を1行ずつ読み、
+    time / type / hitSound / end_time の4列を返す。
+    end_time はスピナーとスライダーだけ実際の値、それ以外は time と同じ。
+    """
+    # array("i") に直接詰めて np.frombuffer で包む手もあるが、append が遅く
+    # 純 Python / mypyc のどちらでも list[int] + np.array の方が速かった
+    times: list[int] = []
+    obj_types: list[int] = []
+    hitsounds: list[int] = []
+    ends: list[int] = []
+
+    # split("\n") / strip / split(",") で行ごとにリストを作らず、
+    # find で区切り位置だけ探してフィールドを直接 int() する。
+    # int() / float() は前後の空白を無視するので strip も要らない。
+    # 空行・コメント行はカンマが足りないか x が整数にならないので自然に落ちる
+    # （純 Python では split 版より遅いが、未コンパイル時は beatmapview 側の正規表現版が使われる）
+    n = len(section)
+    pos = 0
+    while pos < n:
+        start = pos
+        nl = section.find("\n", start)
+        if nl < 0:
+            nl = n
+        pos = nl + 1
+
+        # x,y,time,type,hitSound[,...] の区切り4つ（5つ目は無くてもよい）
+        c0 = section.find(",", start, nl)
+        if c0 < 0:
+            continue
+        c1 = section.find(",", c0 + 1, nl)
+        if c1 < 0:
+            continue
+        c2 = section.find(",", c1 + 1, nl)
+        if c2 < 0:
+            continue
+        c3 = section.find(",", c2 + 1, nl)
+        if c3 < 0:
+            continue
+        c4 = section.find(",", c3 + 1, nl)
+
+        try:
+            int(section[start:c0])   # x (値は使わないが整数でない行は捨てる)
+            hit_time = int(section[c1 + 1:c2])
+            obj_type = int(section[c2 + 1:c3])
+            hitsound = int(section[c3 + 1:c4 if c4 >= 0 else nl])
+        except ValueError:
+            continue
+
+        end_time = hit_time
+        if c4 >= 0:
+            try:
+                if obj_type & 8:
+                    c5 = section.find(",", c4 + 1, nl)
+                    end_time = int(section[c4 + 1:c5 if c5 >= 0 else nl])
+                elif obj_type & 2:
+                    # x,y,time,type,hitSound,curve,slides,length[,...]
+                    c5 = section.find(",", c4 + 1, nl)
+                    c6 = section.find(",", c5 + 1, nl) if c5 >= 0 else -1
+                    if c6 >= 0:
+                        c7 = section.find(",", c6 + 1, nl)
+                        int(section[c5 + 1:c6])   # slides
+                        end_time = hit_time + int(float(section[c6 + 1:c7 if c7 >= 0 else nl]) * 10)  # 暫定
+            except ValueError:
+                pass
+
+        times.append(hit_time)
+        obj_types.append(obj_type)
+        hitsounds.append(hitsound)
+        ends.append(end_time)
+
+    return times, obj_types, hitsounds, ends
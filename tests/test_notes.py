@@ -0,0 +1,119 @@
+"""
+NoteArrays の組み立てと、パース結果のディスクキャッシュの確認。
+
+    python -m unittest discover -s tests -t .
+"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+try:
+    import beatmapview
+except ImportError:   # pygame / websocket-client が無い環境
+    beatmapview = None
+
+
+@unittest.skipIf(beatmapview is None, "beatmapview を import できない (pygame / websocket-client)")
+class MakeNoteArraysTest(unittest.TestCase):
+    def test_out_of_range_times_are_clipped_not_wrapped(self):
+        times = np.array([-99999999999, 0, 1000, 99999999999], dtype=np.int64)
+        ends  = np.array([-99999999999, 0, 99999999999, 99999999999], dtype=np.int64)
+        tids  = np.full(4, beatmapview.TYPE_DON, dtype=np.uint8)
+        notes = beatmapview.make_note_arrays(times, ends, tids)
+
+        self.assertEqual(notes.times_ms.tolist(),
+                         [beatmapview.TIME_MS_MIN, 0, 1000, beatmapview.TIME_MS_MAX])
+        self.assertTrue(np.all(np.diff(notes.times_ms.astype(np.int64)) >= 0))
+        self.assertEqual(notes.end_times_ms[2], beatmapview.TIME_MS_MAX)
+        self.assertEqual(notes.max_hold_ms, beatmapview.TIME_MS_MAX - 1000)
+        # 窓の検索が巻き戻った値に引っかからない
+        self.assertEqual(np.searchsorted(notes.times_ms, [0, 2000]).tolist(), [1, 3])
+
+    def test_parse_keeps_huge_times_sorted(self):
+        content = "[HitObjects]\n" + "\n".join([
+            "256,192,1000,1,0",
+            "256,192,99999999999,1,0",
+            "256,192,2000,1,0",
+        ])
+        notes = beatmapview.parse_osu_taiko_arrays(content)
+        self.assertEqual(notes.times_ms.tolist(), [1000, 2000, beatmapview.TIME_MS_MAX])
+
+    def test_empty(self):
+        self.assertEqual(len(beatmapview.EMPTY_NOTES), 0)
+        self.assertEqual(beatmapview.EMPTY_NOTES.max_hold_ms, 0)
+
+
+CHART = "[General]\nMode: 1\n\n[HitObjects]\n" + "\n".join([
+    "256,192,1000,1,0",
+    "256,192,1500,1,8",
+    "256,192,2000,2,4,B|300:192,1,100",
+    "256,192,3000,12,0,4000",
+]) + "\n"
+
+
+@unittest.skipIf(beatmapview is None, "beatmapview を import できない (pygame / websocket-client)")
+class NotesCacheTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_dir = os.path.join(tmp.name, "cache")
+        patcher = mock.patch.object(beatmapview, "NOTES_CACHE_DIR", self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.osu_path = os.path.join(tmp.name, "map.osu")
+        with open(self.osu_path, "w", encoding="utf-8") as f:
+            f.write(CHART)
+
+    def _assert_same_notes(self, a, b):
+        for name in ("times_ms", "end_times_ms", "type_id", "base_px", "base_end_px",
+                     "reg_idx", "roll_idx", "spin_idx"):
+            np.testing.assert_array_equal(getattr(a, name), getattr(b, name), err_msg=name)
+        self.assertEqual(a.max_hold_ms, b.max_hold_ms)
+
+    def test_round_trip(self):
+        parsed = beatmapview.load_note_arrays(self.osu_path)
+        self.assertEqual(os.listdir(self.cache_dir),
+                         [os.path.basename(beatmapview.notes_cache_path(self.osu_path))])
+        # 2回目はキャッシュから読む（パーサーは呼ばれない）
+        with mock.patch.object(beatmapview, "parse_osu_taiko_arrays", side_effect=AssertionError):
+            cached = beatmapview.load_note_arrays(self.osu_path)
+        self._assert_same_notes(parsed, cached)
+        self._assert_same_notes(parsed, beatmapview.parse_osu_taiko_arrays(CHART))
+
+    def test_corrupt_cache_is_reparsed_and_rewritten(self):
+        expected   = beatmapview.load_note_arrays(self.osu_path)
+        cache_path = beatmapview.notes_cache_path(self.osu_path)
+        with open(cache_path, "wb") as f:
+            f.write(b"not an npz")
+        self._assert_same_notes(beatmapview.load_note_arrays(self.osu_path), expected)
+        with np.load(cache_path) as z:
+            np.testing.assert_array_equal(z["times"], expected.times_ms)
+
+    def test_failed_write_leaves_no_tmp_file(self):
+        with mock.patch.object(beatmapview.np, "savez", side_effect=OSError("disk full")):
+            arrays = beatmapview.load_note_arrays(self.osu_path)
+        self.assertEqual(len(arrays), 4)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_prune_removes_least_recently_used(self):
+        os.makedirs(self.cache_dir)
+        for i in range(5):
+            path = os.path.join(self.cache_dir, f"{i}.npz")
+            open(path, "wb").close()
+            os.utime(path, (1000 + i, 1000 + i))
+        beatmapview.prune_notes_cache(max_files=3)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ["2.npz", "3.npz", "4.npz"])
+
+    def test_cache_hit_refreshes_mtime(self):
+        beatmapview.load_note_arrays(self.osu_path)
+        cache_path = beatmapview.notes_cache_path(self.osu_path)
+        os.utime(cache_path, (1000, 1000))
+        beatmapview.load_note_arrays(self.osu_path)
+        self.assertGreater(os.path.getmtime(cache_path), 1000)
+
+
+if __name__ == "__main__":
+    unittest.main()
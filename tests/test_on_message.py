@@ -0,0 +1,102 @@
+"""
+/v2 フレームの処理 (on_message) の確認。
+
+前回と同じフレームはパースを飛ばして prev_state だけ進めるので、
+同じフレームが続いても演奏開始の検出がずれないことを見る。
+
+    python -m unittest discover -s tests -t .
+"""
+import json
+import unittest
+from unittest import mock
+
+try:
+    import beatmapview
+except ImportError:   # pygame / websocket-client が無い環境
+    beatmapview = None
+
+
+def _frame(state_name: str, mods: int = 0, spacing: str = "") -> bytes:
+    data = {
+        "state": {"name": state_name},
+        "play": {"mods": {"number": mods}},
+        "beatmap": {"time": {"live": 1000}},
+        "directPath": {"beatmapFile": "a/b.osu"},
+        "folders": {"songs": "/songs"},
+    }
+    # spacing を変えると中身は同じでもバイト列が変わり、重複判定を通らない
+    return json.dumps(data, separators=("," + spacing, ":")).encode()
+
+
+MENU      = _frame("Menu")
+PLAYING   = _frame("Playing", mods=64)
+PLAYING_2 = _frame("Playing", mods=64, spacing=" ")   # PLAYING と同じ内容で別のバイト列
+
+
+@unittest.skipIf(beatmapview is None, "beatmapview を import できない (pygame / websocket-client)")
+class OnMessageTest(unittest.TestCase):
+    def setUp(self):
+        for name, value in (("state", beatmapview.GameState()),
+                            ("_last_message", None),
+                            ("_debug_dumped", True)):   # 最初の1回のダンプを出さない
+            patcher = mock.patch.object(beatmapview, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def reset(self):
+        beatmapview.state = beatmapview.GameState()
+        beatmapview._last_message = None
+
+    def feed(self, message: bytes) -> tuple:
+        with mock.patch("builtins.print"):
+            beatmapview.on_message(None, message)
+        s = beatmapview.state
+        return s.playing, s.mod_label, s.prev_state, s.state_name
+
+    def test_without_duplicate(self):
+        self.assertEqual(self.feed(MENU),    (False, "",   "Menu",    "Menu"))
+        self.assertEqual(self.feed(PLAYING), (True,  "DT", "Menu",    "Playing"))
+        self.assertEqual(self.feed(MENU),    (False, "DT", "Playing", "Menu"))
+
+    def test_with_duplicate(self):
+        self.assertEqual(self.feed(MENU),    (False, "",   "Menu",    "Menu"))
+        self.assertEqual(self.feed(PLAYING), (True,  "DT", "Menu",    "Playing"))
+        # 同じバイト列はパースされないが、prev_state は Playing に進む
+        with mock.patch.object(beatmapview, "json_loads", side_effect=AssertionError):
+            self.assertEqual(self.feed(PLAYING), (True, "DT", "Playing", "Playing"))
+        self.assertEqual(self.feed(MENU),    (False, "DT", "Playing", "Menu"))
+
+    def test_duplicate_matches_full_processing(self):
+        # 重複として飛ばした時と、同じ内容をパースし直した時で状態が変わらない
+        self.feed(MENU)
+        self.feed(PLAYING)
+        skipped = self.feed(PLAYING)
+
+        self.reset()
+        self.feed(MENU)
+        self.feed(PLAYING)
+        parsed = self.feed(PLAYING_2)
+        self.assertEqual(skipped, parsed)
+
+    def test_play_restart_after_duplicates(self):
+        self.feed(MENU)
+        self.feed(PLAYING)
+        self.feed(PLAYING)
+        self.feed(MENU)
+        self.feed(MENU)
+        beatmapview.state.mod_label = ""
+        # Menu が続いた後の Playing はもう一度演奏開始として拾う
+        self.assertEqual(self.feed(PLAYING), (True, "DT", "Menu", "Playing"))
+
+    def test_repeated_playing_does_not_restart_play(self):
+        self.feed(MENU)
+        self.feed(PLAYING)
+        beatmapview.state.mod_label = "sentinel"
+        self.feed(PLAYING)     # 重複
+        self.feed(PLAYING_2)   # 中身は同じで別のバイト列
+        # 演奏中のまま Playing が続いても開始処理はやり直さない
+        self.assertEqual(beatmapview.state.mod_label, "sentinel")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+/v2/precise フレームの読み取り (parse_current_time / apply_precise_message) の確認。
+
+    python -m unittest discover -s tests -t .
+"""
+import json
+import unittest
+
+try:
+    import beatmapview
+except ImportError:   # pygame / websocket-client が無い環境
+    beatmapview = None
+
+
+def _both(text: str):
+    """同じフレームを str / bytes の両方で返す（tosu はどちらでも送ってくる）"""
+    return (text, text.encode())
+
+
+@unittest.skipIf(beatmapview is None, "beatmapview を import できない (pygame / websocket-client)")
+class ParseCurrentTimeTest(unittest.TestCase):
+    def assertParses(self, text: str, expected):
+        for message in _both(text):
+            with self.subTest(message=message):
+                t = beatmapview.parse_current_time(message)
+                self.assertEqual(t, expected)
+                self.assertIs(type(t), type(expected))
+
+    def test_int(self):
+        self.assertParses('{"currentTime":12345,"x":1}', 12345)
+
+    def test_float(self):
+        self.assertParses('{"currentTime":12345.75,"x":1}', 12345.75)
+
+    def test_negative(self):
+        self.assertParses('{"currentTime":-1500,"x":1}', -1500)
+        self.assertParses('{"currentTime":-0.5,"x":1}', -0.5)
+
+    def test_whitespace_around_value(self):
+        self.assertParses('{"currentTime": 12 ,"x":1}', 12)
+        self.assertParses('{"currentTime":\t12.5\n}', 12.5)
+
+    def test_whitespace_before_colon_uses_json(self):
+        # キーが見つからないので JSON 全体のパースに落ちる
+        self.assertParses('{"currentTime" : 12}', 12)
+
+    def test_last_key_before_brace(self):
+        self.assertParses('{"x":1,"currentTime":12}', 12)
+        self.assertParses('{"x":1,"currentTime":12.5}', 12.5)
+
+    def test_matches_json_loads(self):
+        for text in ('{"currentTime":0}', '{"currentTime":7,"a":[1,2]}', '{"a":{"b":1},"currentTime":7.25}',
+                     '{"currentTime":1e3}', '{"currentTime":-2.5E-1}'):
+            self.assertParses(text, json.loads(text)["currentTime"])
+
+    def test_missing_key(self):
+        self.assertParses('{"x":1}', None)
+        self.assertParses('{}', None)
+
+    def test_null(self):
+        self.assertParses('{"currentTime":null}', None)
+
+    def test_non_dict_json(self):
+        for text in ("[]", "[1,2]", "12", '"x"', "null", "true"):
+            self.assertParses(text, None)
+
+    def test_malformed(self):
+        for text in ("", "{", '{"currentTime":', '{"currentTime":}', '{"currentTime":abc}', "\x00garbage"):
+            self.assertParses(text, None)
+
+    def test_lenient_fast_path(self):
+        # 高速経路は値だけを int() / float() で読むので、JSON なら弾かれる形も通す（docstring 参照）
+        self.assertParses('{"currentTime":1.}', 1.0)
+        self.assertParses('{"currentTime":.5}', 0.5)
+        self.assertParses('{"currentTime":12,}', 12)
+        for text in ('{"currentTime":1.}', '{"currentTime":.5}', '{"currentTime":12,}'):
+            with self.assertRaises(ValueError):
+                json.loads(text)
+
+
+@unittest.skipIf(beatmapview is None, "beatmapview を import できない (pygame / websocket-client)")
+class BadPreciseFrameTest(unittest.TestCase):
+    """描画スレッドで読むので、壊れたフレームは例外ではなく None で捨てる"""
+
+    BAD_FRAMES = (
+        "[]",
+        "12",
+        '"currentTime"',
+        "null",
+        '{"currentTime":"12"}',
+        '{"currentTime":true}',
+        '{"currentTime":null}',
+        '{"currentTime":[1]}',
+        '{"currentTime":{"a":1}}',
+        '{"currentTime":NaN}',
+        '{"currentTime":Infinity}',
+        '{"currentTime":1.5e400}',
+        '{"other":1}',
+    )
+
+    def test_bad_frames_return_none(self):
+        for text in self.BAD_FRAMES:
+            for message in _both(text):
+                with self.subTest(message=message):
+                    self.assertIsNone(beatmapview.parse_current_time(message))
+
+    def test_apply_ignores_bad_frames(self):
+        state = beatmapview.state
+        saved = (state.interp_game, state.interp_wall, state.interp_speed)
+        try:
+            state.interp_game, state.interp_wall = 1234, 1.0
+            for text in self.BAD_FRAMES:
+                for message in _both(text):
+                    beatmapview.apply_precise_message(2.0, message)
+            self.assertEqual((state.interp_game, state.interp_wall), (1234, 1.0))
+
+            beatmapview.apply_precise_message(3.0, b'{"currentTime":1500}')
+            self.assertEqual((state.interp_game, state.interp_wall), (1500, 3.0))
+        finally:
+            state.interp_game, state.interp_wall, state.interp_speed = saved
+
+
+if __name__ == "__main__":
+    unittest.main()
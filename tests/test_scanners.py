@@ -0,0 +1,144 @@
+r"""
+[HitObjects] スキャナの一致確認。
+
+scan_hit_objects には numba / mypyc (taiko_parse) / 正規表現 の3実装があるので、
+既知の答えを持つ小さな譜面と、ランダムに作った譜面で全実装が同じ4列を返すことを見る。
+（譜面はテキストモードで読むので、スキャナに渡る改行は常に \n）
+taiko_parse 単体の確認は常に走る。beatmapview 側の実装は pygame / websocket-client が
+無ければ飛ばし、numba 版は numba が入っていなければ飛ばす。
+
+    python -m unittest discover -s tests -t .
+"""
+import os
+import random
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import taiko_parse
+
+try:
+    import beatmapview
+except ImportError:   # pygame / websocket-client が無い環境
+    beatmapview = None
+
+
+# 崩れた行・空白・負数など、実装ごとに差が出やすい行を集めた譜面
+FIXTURE = "\n".join([
+    "64,192,1000,1,0,0:0:0:0:",
+    "  128 , 192 , 1250 , 5 , 2 ,0:0:0:0:",
+    "// comment",
+    "",
+    "256,192,1500,1,12",
+    "256,192.5,1750,2,4,B|300:192,2,150.5,0|0",
+    "256,192,2000,2,0,B|300:192,x,100",           # slides が数値でない → 終了時刻なし
+    "256,192,2250,2,0,B|300:192",                 # 長さが無い → 終了時刻なし
+    "256,192,2500,12,0,4000,0:0:0:0:",
+    "256,192,4500,8,0",                           # スピナーだが終了時刻なし
+    "256,192,5000,1.5,0",                         # type が小数 → 行ごと無視
+    "256,192,5250,1",                             # 列が足りない → 行ごと無視
+    "-5,192,-100,1,8",
+    "garbage",
+])
+FIXTURE_EXPECTED = [
+    [1000, 1250, 1500, 1750, 2000, 2250, 2500, 4500, -100],
+    [1, 5, 1, 2, 2, 2, 12, 8, 1],
+    [0, 2, 12, 4, 0, 0, 0, 0, 8],
+    [1000, 1250, 1500, 1750 + 1505, 2000, 2250, 4000, 4500, -100],
+]
+
+
+def _random_section(n: int, seed: int) -> str:
+    r = random.Random(seed)
+    lines = []
+    t = 0
+    for _ in range(n):
+        t += r.choice([0, 50, 100, 125])
+        k = r.random()
+        hs = r.choice([0, 2, 4, 6, 8, 12])
+        if k < 0.1:
+            lines.append(f"256,192,{t},2,{hs},B|300:192,{r.randint(1, 3)},{r.uniform(10, 300):.2f},0|0")
+        elif k < 0.15:
+            lines.append(f"256,192,{t},12,0,{t + r.randint(100, 2000)},0:0:0:0:")
+        elif k < 0.17:
+            lines.append("// comment")
+        elif k < 0.18:
+            lines.append("")
+        elif k < 0.19:
+            lines.append(f"256,192,{t},8,0")
+        else:
+            lines.append(f"{r.randint(0, 512)},192,{t},{r.choice([1, 5])},{hs},0:0:0:0:")
+    return "\n".join(lines)
+
+
+def _columns(result) -> list:
+    return [np.asarray(col, dtype=np.int64).tolist() for col in result]
+
+
+class TaikoParseTest(unittest.TestCase):
+    """taiko_parse は依存が無いので、どの環境でも既知の答えと突き合わせる"""
+
+    def test_fixture(self):
+        self.assertEqual(_columns(taiko_parse.scan_hit_objects(FIXTURE)), FIXTURE_EXPECTED)
+
+    def test_empty(self):
+        self.assertEqual(_columns(taiko_parse.scan_hit_objects("")), [[], [], [], []])
+
+
+@unittest.skipIf(beatmapview is None, "beatmapview を import できない (pygame / websocket-client)")
+class BeatmapviewScannerTest(unittest.TestCase):
+    """beatmapview 側の正規表現版・numba 版が taiko_parse と同じ4列を返すか"""
+
+    def _scanners(self) -> dict:
+        scanners = {"regex": beatmapview._scan_hit_objects_re}
+        if beatmapview.HAVE_NUMBA:
+            scanners["numba"] = beatmapview._scan_hit_objects_nb
+        return scanners
+
+    def test_fixture(self):
+        for name, scan in self._scanners().items():
+            with self.subTest(scanner=name):
+                self.assertEqual(_columns(scan(FIXTURE)), FIXTURE_EXPECTED)
+
+    def test_empty(self):
+        for name, scan in self._scanners().items():
+            with self.subTest(scanner=name):
+                self.assertEqual(_columns(scan("")), [[], [], [], []])
+
+    def test_random_sections_agree(self):
+        scanners = self._scanners()
+        for seed in range(20):
+            section  = _random_section(300, seed)
+            expected = _columns(taiko_parse.scan_hit_objects(section))
+            for name, scan in scanners.items():
+                with self.subTest(scanner=name, seed=seed):
+                    self.assertEqual(_columns(scan(section)), expected)
+
+    def test_numba_is_selected(self):
+        if not beatmapview.HAVE_NUMBA:
+            self.skipTest("numba が入っていない")
+        section = _random_section(50, 0)
+        self.assertEqual(_columns(beatmapview.scan_hit_objects(section)),
+                         _columns(beatmapview._scan_hit_objects_nb(section)))
+
+    def test_falls_back_when_numba_cannot_load(self):
+        section = _random_section(50, 1)
+        with mock.patch.object(beatmapview, "_numba_ready", False):
+            self.assertEqual(_columns(beatmapview.scan_hit_objects(section)),
+                             _columns(taiko_parse.scan_hit_objects(section)))
+
+    def test_numba_not_imported_by_renderer(self):
+        # numba を読むのはパースするワーカーだけ。描画側のプロセスは import だけで重くしない
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code = "import sys, beatmapview; print('numba' in sys.modules)"
+        env  = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1")
+        out  = subprocess.run([sys.executable, "-c", code], cwd=root, env=env,
+                              capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.split()[-1], "False")
+
+
+if __name__ == "__main__":
+    unittest.main()